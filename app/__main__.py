@@ -0,0 +1,24 @@
+import uvicorn
+
+from .config import settings
+
+
+def main() -> None:
+    """
+    Запуск сервиса: python -m app
+    loop/http="auto" выбирают uvloop и httptools, если они установлены
+    (uvloop недоступен на Windows, там используется стандартный asyncio).
+    """
+    uvicorn.run(
+        "app.main:app",
+        host=settings.host,
+        port=settings.port,
+        loop="auto",
+        http="auto",
+        # Планировщик работает внутри процесса: каждый воркер запустит свои jobs
+        workers=settings.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import logging
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import exists
 from sqlalchemy.orm import Session
 
 from app.db import get_db
@@ -16,15 +17,14 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/register", status_code=201)
 def register(req: RegisterRequest, db: Session = Depends(get_db)):
-    exists = db.query(User).filter(User.email == req.email).one_or_none()
-    if exists:
+    taken = db.query(exists().where(User.email == req.email)).scalar()
+    if taken:
         logger.warning("register failed | email=%s | reason=email_taken", req.email)
         raise HTTPException(status_code=409, detail="Email already registered")
 
     user = User(email=req.email, password_hash=hash_password(req.password))
     db.add(user)
     db.commit()
-    db.refresh(user)
     logger.info("register success | user_id=%s | email=%s", user.id, user.email)
     return {"id": user.id, "email": user.email}
 
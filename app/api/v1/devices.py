@@ -1,11 +1,12 @@
 import logging
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 
 from app.db import get_db
-from app.deps import get_user_device_or_404, get_current_user
-from app.models import User, Device, AutoUpdateSchedule
+from app.deps import get_user_device_or_404, get_current_user_id, read_only_load_options
+from app.models import Device, AutoUpdateSchedule
 from app.schemas import (
     DeviceCreate,
     DeviceUpdate,
@@ -13,7 +14,11 @@ from app.schemas import (
 )
 from app.config import settings
 from app.security import encrypt_device_password
-from app.services.scheduler_service import scheduler_rebuild_jobs_from_db
+from app.services import forget_cached_products
+from app.services.scheduler_service import (
+    scheduler_remove_job,
+    scheduler_upsert_job,
+)
 
 logger = logging.getLogger("app.main")
 
@@ -21,30 +26,47 @@ router = APIRouter(prefix="/devices", tags=["devices"])
 
 
 @router.get("", response_model=list[DeviceOut])
-def list_devices(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def list_devices(
+    db: Session = Depends(get_db), user_id: int = Depends(get_current_user_id)
+):
     logger.info(
         "list devices | user_id=%s",
-        user.id,
+        user_id,
     )
-    return db.query(Device).filter(Device.owner_id == user.id).all()
+    # Только колонки DeviceOut: products_cache_json может весить мегабайты
+    rows = (
+        db.query(
+            Device.id,
+            Device.name,
+            Device.description,
+            Device.ip,
+            Device.port,
+            Device.protocol,
+            Device.cached_dirty,
+        )
+        .filter(Device.owner_id == user_id)
+        .all()
+    )
+    # Сериализуем один раз сами: Response FastAPI повторно не валидирует
+    return ORJSONResponse([DeviceOut.model_validate(d).model_dump() for d in rows])
 
 
 @router.post("", response_model=DeviceOut, status_code=201)
 def create_device(
     req: DeviceCreate,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
 ):
-    logger.info(
+    logger.debug(
         "create device requested | user_id=%s | name=%s | ip=%s | port=%s | protocol=%s",
-        user.id,
+        user_id,
         req.name,
         req.ip,
         req.port,
         req.protocol,
     )
     dev = Device(
-        owner_id=user.id,
+        owner_id=user_id,
         name=req.name,
         description=req.description,
         ip=req.ip,
@@ -53,6 +75,14 @@ def create_device(
         password_encrypted=encrypt_device_password(req.password),
         products_cache_json=None,
         cached_dirty=False,
+        # Расписание сохраняется каскадом вместе с устройством в одном flush
+        schedule=AutoUpdateSchedule(
+            enabled=settings.scheduler_enabled,
+            interval_minutes=settings.scheduler_interval,
+            last_run_utc=None,
+            last_status=None,
+            last_error=None,
+        ),
     )
     db.add(dev)
     try:
@@ -61,32 +91,24 @@ def create_device(
         db.rollback()
         logger.warning(
             "create device failed | user_id=%s | name=%s | reason=name_conflict",
-            user.id,
+            user_id,
             req.name,
         )
         raise HTTPException(
             status_code=409, detail="Device with this name already exists"
         )
 
-    db.refresh(dev)
-
-    sch = AutoUpdateSchedule(
-        device_id=dev.id,
-        enabled=settings.scheduler_enabled,
-        interval_minutes=settings.scheduler_interval,
-        last_run_utc=None,
-        last_status=None,
-        last_error=None,
-    )
-    db.add(sch)
-    db.commit()
     logger.info(
         "create device success | user_id=%s | device_id=%s | name=%s",
-        user.id,
+        user_id,
         dev.id,
         dev.name,
     )
-    scheduler_rebuild_jobs_from_db()
+    scheduler_upsert_job(
+        dev.id,
+        enabled=settings.scheduler_enabled,
+        interval_minutes=settings.scheduler_interval,
+    )
     return dev
 
 
@@ -94,21 +116,23 @@ def create_device(
 def get_device(
     device_id: int,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
 ):
-    logger.info(
+    logger.debug(
         "get device requested | user_id=%s | device_id=%s",
-        user.id,
+        user_id,
         device_id,
     )
-    device = get_user_device_or_404(db, user.id, device_id)
+    device = get_user_device_or_404(
+        db, user_id, device_id, options=read_only_load_options()
+    )
 
     logger.info(
         "get device success | user_id=%s | device_id=%s",
-        user.id,
+        user_id,
         device_id,
     )
-    return device
+    return ORJSONResponse(DeviceOut.model_validate(device).model_dump())
 
 
 @router.put("/{device_id}", response_model=DeviceOut)
@@ -116,14 +140,14 @@ def update_device(
     device_id: int,
     req: DeviceUpdate,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
 ):
-    logger.info(
+    logger.debug(
         "update device requested | user_id=%s | device_id=%s",
-        user.id,
+        user_id,
         device_id,
     )
-    dev = get_user_device_or_404(db, user.id, device_id)
+    dev = get_user_device_or_404(db, user_id, device_id)
 
     if req.name is not None:
         dev.name = req.name
@@ -145,14 +169,13 @@ def update_device(
         db.rollback()
         logger.warning(
             "update device failed | user_id=%s | device_id=%s | reason=name_conflict",
-            user.id,
+            user_id,
             device_id,
         )
         raise HTTPException(status_code=409, detail="Device name conflict")
-    db.refresh(dev)
     logger.info(
         "update device success | user_id=%s | device_id=%s",
-        user.id,
+        user_id,
         device_id,
     )
     return dev
@@ -162,23 +185,21 @@ def update_device(
 def delete_device(
     device_id: int,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
 ):
-    logger.info(
+    logger.debug(
         "delete device requested | user_id=%s | device_id=%s",
-        user.id,
+        user_id,
         device_id,
     )
-    dev = get_user_device_or_404(db, user.id, device_id)
+    dev = get_user_device_or_404(db, user_id, device_id)
     db.delete(dev)
     db.commit()
     logger.info(
         "delete device success | user_id=%s | device_id=%s",
-        user.id,
+        user_id,
         device_id,
     )
-    if settings.scheduler_enabled:
-        scheduler_rebuild_jobs_from_db()
-    else:
-        logger.info("scheduler disabled | skip rebuild_jobs_from_db")
+    scheduler_remove_job(device_id)
+    forget_cached_products(device_id)
     return None
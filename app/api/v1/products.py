@@ -1,10 +1,9 @@
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from scales.exceptions import DeviceError
 from sqlalchemy.orm import Session
 from app.db import get_db
-from app.models import User
 from app.schemas import (
     ProductsResponse,
     ProductPatchRequest,
@@ -13,8 +12,14 @@ from app.services import (
     fetch_products_and_cache,
     push_cache_to_scales,
 )
-from app.services import load_cached_products, save_cached_products
-from app.deps import get_current_user, get_user_device_or_404
+from app.services import (
+    cached_products_response_body,
+    forget_plu_index,
+    load_cached_products,
+    patch_cached_product,
+    save_cached_products,
+)
+from app.deps import get_current_user_id, get_user_device_or_404, read_only_load_options
 
 logger = logging.getLogger("app.main")
 
@@ -25,30 +30,37 @@ router = APIRouter(prefix="/devices", tags=["products"])
 def fetch_products(
     device_id: int,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
 ):
-    logger.info(
+    logger.debug(
         "fetch products requested | user_id=%s | device_id=%s",
-        user.id,
+        user_id,
         device_id,
     )
-    dev = get_user_device_or_404(db, user.id, device_id)
+    dev = get_user_device_or_404(db, user_id, device_id)
     try:
         products = fetch_products_and_cache(db, dev)
-        count = "n/a"
-        if isinstance(products, dict) and isinstance(products.get("products"), list):
-            count = len(products["products"])
-        logger.info(
-            "fetch products success | user_id=%s | device_id=%s | count=%s",
-            user.id,
-            device_id,
-            count,
+        if logger.isEnabledFor(logging.INFO):
+            count = "n/a"
+            if isinstance(products, dict) and isinstance(
+                products.get("products"), list
+            ):
+                count = len(products["products"])
+            logger.info(
+                "fetch products success | user_id=%s | device_id=%s | count=%s",
+                user_id,
+                device_id,
+                count,
+            )
+        # Данные пришли с весов как JSON и уже сериализованы в кэш: тело
+        # ответа собирается из сохранённой строки, response_model — для OpenAPI
+        return Response(
+            content=cached_products_response_body(dev), media_type="application/json"
         )
-        return ProductsResponse(products=products)
     except DeviceError as e:
         logger.warning(
             "fetch products failed | user_id=%s | device_id=%s | status=503 | err=%s",
-            user.id,
+            user_id,
             device_id,
             str(e),
         )
@@ -59,20 +71,24 @@ def fetch_products(
 def get_cached_products(
     device_id: int,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
 ):
-    logger.info(
+    logger.debug(
         "get cached products requested | user_id=%s | device_id=%s",
-        user.id,
+        user_id,
         device_id,
     )
-    dev = get_user_device_or_404(db, user.id, device_id)
+    dev = get_user_device_or_404(
+        db, user_id, device_id, options=read_only_load_options()
+    )
     logger.info(
         "get cached products success | user_id=%s | device_id=%s",
-        user.id,
+        user_id,
         device_id,
     )
-    return ProductsResponse(products=load_cached_products(dev))
+    return Response(
+        content=cached_products_response_body(dev), media_type="application/json"
+    )
 
 
 @router.patch("/{device_id}/products/{plu}", response_model=ProductsResponse)
@@ -81,81 +97,78 @@ def patch_product_by_plu(
     plu: str,
     req: ProductPatchRequest,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
 ):
-    logger.info(
+    logger.debug(
         "patch product requested | user_id=%s | device_id=%s | plu=%s",
-        user.id,
+        user_id,
         device_id,
         plu,
     )
 
-    dev = get_user_device_or_404(db, user.id, device_id)
+    dev = get_user_device_or_404(db, user_id, device_id)
     products = load_cached_products(dev)
 
     items = products.get("products", [])
     if not isinstance(items, list):
         logger.error(
             "patch product failed | user_id=%s | device_id=%s | plu=%s | reason=invalid_cache_format",
-            user.id,
+            user_id,
             device_id,
             plu,
         )
         raise HTTPException(status_code=400, detail="Invalid cached products format")
 
-    found = False
-    for p in items:
-
-        if isinstance(p, dict) and "pluNumber" in p and str(p["pluNumber"]) == str(plu):
-            for k, v in req.fields.items():
-                p[k] = v
-            found = True
-            break
-
-    if not found:
+    # Кэш общий с параллельными запросами: правка собирается в копии
+    products = patch_cached_product(dev, products, plu, req.fields)
+    if products is None:
         logger.warning(
             "patch product failed | user_id=%s | device_id=%s | plu=%s | reason=not_found",
-            user.id,
+            user_id,
             device_id,
             plu,
         )
         raise HTTPException(status_code=404, detail="Product not found (plu)")
 
     save_cached_products(db, dev, products, dirty=True)
+    if "pluNumber" in req.fields:
+        forget_plu_index(dev.id)
     logger.info(
         "patch product success | user_id=%s | device_id=%s | plu=%s | fields_updated=%s",
-        user.id,
+        user_id,
         device_id,
         plu,
         len(req.fields),
     )
-    return ProductsResponse(products=products)
+    return Response(
+        content=cached_products_response_body(dev), media_type="application/json"
+    )
 
 
 @router.post("/{device_id}/upload", status_code=200)
 def upload_cache(
     device_id: int,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
 ):
-    logger.info(
+    logger.debug(
         "upload cache requested | user_id=%s | device_id=%s",
-        user.id,
+        user_id,
         device_id,
     )
-    dev = get_user_device_or_404(db, user.id, device_id)
+    dev = get_user_device_or_404(db, user_id, device_id)
     try:
         push_cache_to_scales(db, dev)
         logger.info(
             "upload cache success | user_id=%s | device_id=%s",
-            user.id,
+            user_id,
             device_id,
         )
         return {"status": "ok"}
     except DeviceError as e:
         logger.warning(
             "upload cache failed | user_id=%s | device_id=%s | status=503 | err=%s",
-            user.id,
+            user_id,
             device_id,
             str(e),
         )
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import List
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -7,29 +8,61 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
     database_url: str
+    db_pool_size: int = 20
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 3600
+    db_pool_pre_ping: bool = True
+    db_query_cache_size: int = 1000
+    sqlite_tune_pragmas: bool = True
+    sqlite_synchronous_normal: bool = False
+    auto_create_schema: bool = True
     debug: bool = False
     jwt_secret_key: str
     jwt_algorithm: str
     jwt_access_token_minutes: int
+    jwt_decode_cache_size: int = 4096
+    password_hash_rounds: int = 29000
+    user_cache_size: int = 10000
+    user_cache_ttl: int = 60
+    password_verify_cache_size: int = 4096
 
     fernet_key: str
     scheduler_timezone: str
     cors_allow_origins: List[str] = []
     log_level: str = "INFO"
+    log_queue: bool = True
+    host: str = "127.0.0.1"
+    port: int = 8000
+    workers: int = 1
+    threadpool_size: int = 40
+    gzip_minimum_size: int = 1024
 
     scheduler_enabled: bool = False
     scheduler_interval: int = 1440
+    scheduler_max_workers: int = 16
     products_fix_mode: bool = False
+    products_diag_reuse_client: bool = False
+    products_parsed_cache_size: int = 64
 
     auto_reconnect: bool = False
     connect_timeout: float = 3.0
     default_timeout: float = 5.0
     retries: int = 2
     retry_delay: float = 5.0
+    scales_pool_idle_timeout: float = 30.0
     clear_database_while_updating_products: bool = False
     clear_database_while_updating_products_fix_mode: bool = False
 
     scheduler_service_enabled: bool = True
 
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    """
+    Единственный экземпляр настроек на процесс (.env читается один раз).
+    """
+    return Settings()
+
+
+settings = get_settings()
@@ -1,19 +1,66 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 
 from ..config import settings
 
-engine = create_engine(
-    settings.database_url,
-    connect_args=(
-        {"check_same_thread": False}
-        if settings.database_url.startswith("sqlite")
-        else {}
-    ),
-    pool_pre_ping=True,
+
+def _engine_kwargs(database_url: str) -> dict:
+    url = make_url(database_url)
+    kwargs: dict = {
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        # Кэш скомпилированных SQL-выражений (по умолчанию в SQLAlchemy — 500)
+        "query_cache_size": settings.db_query_cache_size,
+    }
+    if url.get_backend_name() == "sqlite":
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            # In-memory SQLite использует SingletonThreadPool без пула соединений
+            return kwargs
+    kwargs.update(
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+    )
+    return kwargs
+
+
+# WAL: читатели не блокируют писателя; надёжность commit при этом остаётся
+# прежней (synchronous=FULL по умолчанию)
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
 )
+# Только по явному SQLITE_SYNCHRONOUS_NORMAL=true: в WAL меньше fsync на commit,
+# но при сбое питания последние зафиксированные транзакции могут потеряться
+# (база при этом не портится)
+_SQLITE_SYNCHRONOUS_NORMAL = "PRAGMA synchronous=NORMAL"
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in _SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        if settings.sqlite_synchronous_normal:
+            cursor.execute(_SQLITE_SYNCHRONOUS_NORMAL)
+    finally:
+        cursor.close()
+
+
+engine = create_engine(settings.database_url, **_engine_kwargs(settings.database_url))
+
+if engine.dialect.name == "sqlite" and settings.sqlite_tune_pragmas:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+
+# Объекты остаются заполненными после commit: ответы собираются из уже
+# известных значений без повторного SELECT на каждое обращение к атрибуту
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+)
 
 
 def get_db():
@@ -1,40 +1,104 @@
+import threading
+
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError
-from sqlalchemy.orm import Session
+from jwt import PyJWTError
+from sqlalchemy import exists
+from sqlalchemy.orm import Session, raiseload
+from sqlalchemy.orm.interfaces import LoaderOption
 
+from .config import settings
 from .db import get_db
-from .models import User
 from .security import decode_access_token
 from .models import User, Device
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Кэш пользователей по id: строка users в пределах TTL не меняется,
+# поэтому большинство запросов обходится без SELECT.
+# Объекты хранятся отсоединёнными от сессии (detached).
+_user_cache: TTLCache = TTLCache(
+    maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl
+)
+# id пользователей, существование которых уже проверено (для get_current_user_id)
+_user_id_cache: TTLCache = TTLCache(
+    maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl
+)
+_user_cache_lock = threading.Lock()
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> User:
+
+def _token_user_id(token: str) -> int:
     try:
-        user_id = decode_access_token(token)
-    except JWTError:
+        return int(decode_access_token(token))
+    except (PyJWTError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
         )
 
-    user = db.query(User).filter(User.id == int(user_id)).one_or_none()
+
+def get_current_user(
+    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> User:
+    user_id = _token_user_id(token)
+    with _user_cache_lock:
+        user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    user = db.query(User).filter(User.id == user_id).one_or_none()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
         )
+    db.expunge(user)
+    with _user_cache_lock:
+        _user_cache[user_id] = user
     return user
 
 
-def get_user_device_or_404(db: Session, user_id: int, device_id: int) -> Device:
-    dev = (
-        db.query(Device)
-        .filter(Device.id == device_id, Device.owner_id == user_id)
-        .one_or_none()
-    )
-    if not dev:
+def get_current_user_id(
+    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> int:
+    """
+    Для эндпоинтов, которым нужен только id: строка users не загружается,
+    проверяется лишь существование пользователя (с кэшем на TTL).
+    """
+    user_id = _token_user_id(token)
+    with _user_cache_lock:
+        if user_id in _user_id_cache or user_id in _user_cache:
+            return user_id
+
+    if not db.query(exists().where(User.id == user_id)).scalar():
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
+        )
+    with _user_cache_lock:
+        _user_id_cache[user_id] = True
+    return user_id
+
+
+def read_only_load_options() -> tuple[LoaderOption, ...]:
+    """
+    Опции загрузки для эндпоинтов только на чтение.
+    В режиме debug любая ленивая загрузка связей падает с ошибкой,
+    чтобы N+1 был заметен при разработке, а не в проде.
+    """
+    if settings.debug:
+        return (raiseload("*"),)
+    return ()
+
+
+def get_user_device_or_404(
+    db: Session,
+    user_id: int,
+    device_id: int,
+    *,
+    options: tuple[LoaderOption, ...] = (),
+) -> Device:
+    # Поиск по первичному ключу: повторный вызов в той же сессии берёт объект
+    # из identity map без SELECT. Чужое устройство — тот же 404, что и отсутствующее.
+    dev = db.get(Device, device_id, options=options)
+    if dev is None or dev.owner_id != user_id:
         raise HTTPException(status_code=404, detail="Device not found")
     return dev
@@ -1,3 +1,3 @@
-from .client import get_scales
+from .client import call_scales, close_scales_client, close_scales_pool, get_scales
 
-__all__ = ["get_scales"]
+__all__ = ["call_scales", "close_scales_client", "close_scales_pool", "get_scales"]
@@ -1,5 +1,9 @@
 import logging
+import threading
+import time
+from typing import Callable, TypeVar
 
+from scales.exceptions import DeviceError
 from scales.scales import Scales
 
 from ...config import settings
@@ -8,13 +12,21 @@ from ...security.fernet import decrypt_device_password
 
 logger = logging.getLogger("app.integrations.mertech")
 
+# Пул подключённых клиентов по device_id: (параметры подключения, время возврата, клиент).
+# Клиент на время операции забирается из пула, поэтому один сокет
+# никогда не используется двумя потоками одновременно.
+_pool: dict[int, tuple[tuple, float, Scales]] = {}
+_pool_lock = threading.Lock()
+
+T = TypeVar("T")
+
 
 def get_scales(device: Device) -> Scales:
     """
     Фабрика клиента весов Mertech.
     """
     password = decrypt_device_password(device.password_encrypted)
-    device_id = getattr(device, "id", None)
+    device_id = device.id
     logger.debug(
         "create scales client | device_id=%s | ip=%s | port=%s | protocol=%s",
         device_id,
@@ -32,3 +44,121 @@ def get_scales(device: Device) -> Scales:
         retries=settings.retries,
         retry_delay=settings.retry_delay,
     )
+
+
+def _connection_key(device: Device) -> tuple:
+    return (device.ip, device.port, device.protocol, device.password_encrypted)
+
+
+def close_scales_client(client: Scales) -> None:
+    """
+    Закрыть сокет клиента сразу. У драйвера нет метода close: сокет
+    закрывается только в __del__, то есть когда до объекта дойдёт сборщик
+    мусора, а до тех пор соединение с весами остаётся занятым.
+    """
+    sock = getattr(client, "_Scales__socket", None)
+    if sock is None:
+        return
+    try:
+        sock.close()
+    except OSError:
+        pass
+
+
+def _is_connection_error(exc: BaseException) -> bool:
+    # Драйвер оборачивает ошибки сокета в DeviceError с исходным OSError в __cause__
+    if isinstance(exc, OSError):
+        return True
+    return isinstance(exc, DeviceError) and isinstance(exc.__cause__, OSError)
+
+
+def _take_pooled(device: Device, key: tuple) -> Scales | None:
+    """
+    Забрать клиент устройства из пула. Заодно из пула выбрасываются
+    простоявшие дольше scales_pool_idle_timeout клиенты всех устройств,
+    чтобы соединения с весами, к которым больше не обращаются, не висели.
+    """
+    now = time.monotonic()
+    idle_timeout = settings.scales_pool_idle_timeout
+    with _pool_lock:
+        entry = _pool.pop(device.id, None)
+        expired = [
+            device_id
+            for device_id, (_, released_at, _) in _pool.items()
+            if now - released_at > idle_timeout
+        ]
+        discarded = [_pool.pop(device_id)[2] for device_id in expired]
+
+    client = None
+    if entry is not None:
+        entry_key, released_at, pooled = entry
+        if entry_key == key and now - released_at <= idle_timeout:
+            client = pooled
+            logger.debug("reuse scales client | device_id=%s", device.id)
+        else:
+            discarded.append(pooled)
+
+    for stale in discarded:
+        close_scales_client(stale)
+    return client
+
+
+def _release(device: Device, key: tuple, client: Scales) -> None:
+    if settings.scales_pool_idle_timeout > 0:
+        entry = (key, time.monotonic(), client)
+        with _pool_lock:
+            kept = _pool.setdefault(device.id, entry)
+        if kept is entry:
+            return
+    # Пул выключен или там уже лежит клиент параллельной операции
+    close_scales_client(client)
+
+
+def call_scales(device: Device, operation: Callable[[Scales], T]) -> T:
+    """
+    Выполнить operation(client) на клиенте весов из пула с уже открытым
+    TCP-соединением. Клиент, простоявший дольше scales_pool_idle_timeout,
+    или подключённый с другими параметрами устройства пересоздаётся.
+
+    Если переиспользованный клиент упал на ошибке соединения (весы закрыли
+    сокет, пока он лежал в пуле), операция один раз повторяется на новом
+    подключении. Клиент после любой ошибки закрывается и в пул не возвращается.
+    """
+    key = _connection_key(device)
+    client = _take_pooled(device, key)
+    reused = client is not None
+    if client is None:
+        client = get_scales(device)
+
+    try:
+        result = operation(client)
+    except BaseException as e:
+        close_scales_client(client)
+        if not (reused and _is_connection_error(e)):
+            raise
+        logger.warning(
+            "pooled scales client failed | reconnect | device_id=%s | err=%s",
+            device.id,
+            e,
+        )
+        client = get_scales(device)
+        try:
+            result = operation(client)
+        except BaseException:
+            close_scales_client(client)
+            raise
+
+    _release(device, key, client)
+    return result
+
+
+def close_scales_pool() -> None:
+    """
+    Закрыть все соединения пула.
+    """
+    with _pool_lock:
+        clients = [client for _, _, client in _pool.values()]
+        _pool.clear()
+    for client in clients:
+        close_scales_client(client)
+    logger.info("scales pool closed | count=%s", len(clients))
@@ -1,13 +1,50 @@
 # app/logging_config.py
 from __future__ import annotations
 
+import atexit
+import logging
+import queue
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
 
+_LOGGER_NAMES = ("app", "uvicorn", "uvicorn.error", "uvicorn.access", "")
 
-def setup_logging(level: str = "INFO") -> None:
+_listener: QueueListener | None = None
+
+
+def _route_through_queue() -> None:
+    """
+    Логгеры пишут в очередь, а вывод в консоль выполняет отдельный поток:
+    потоки запросов не ждут I/O и не блокируются на lock'е StreamHandler.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    console = logging.getLogger("app").handlers[0]
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    for name in _LOGGER_NAMES:
+        logging.getLogger(name).handlers = [queue_handler]
+
+    _listener = QueueListener(log_queue, console, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(_stop_listener)
+
+
+def setup_logging(level: str = "INFO", *, use_queue: bool = True) -> None:
     """
     Централизованная настройка logging для приложения и uvicorn.
-    - Управляется через .env (LOG_LEVEL)
+    - Управляется через .env (LOG_LEVEL, LOG_QUEUE)
     """
     level = (level or "INFO").upper()
 
@@ -50,3 +87,6 @@ def setup_logging(level: str = "INFO") -> None:
             "root": {"handlers": ["console"], "level": level},
         }
     )
+
+    if use_queue:
+        _route_through_queue()
@@ -1,11 +1,15 @@
 import logging
 
+import anyio.to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 
 from .api.router import api_router
 from .config import settings
 from .db import Base, engine
+from .integrations.mertech import close_scales_pool
 from .logging_config import setup_logging
 from .services.scheduler_service import (
     scheduler_rebuild_jobs_from_db,
@@ -13,17 +17,16 @@ from .services.scheduler_service import (
     scheduler_shutdown,
 )
 
-setup_logging(settings.log_level)
+setup_logging(settings.log_level, use_queue=settings.log_queue)
 logger = logging.getLogger("app.main")
 
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(
     title="Scales API",
     version="1.0.0",
     docs_url="/docs" if settings.debug else None,
     redoc_url="/redoc" if settings.debug else None,
     openapi_url="/openapi.json" if settings.debug else None,
+    default_response_class=ORJSONResponse,
 )
 logger.info("Application started")
 logger.info("CORS origins: %s", settings.cors_allow_origins)
@@ -31,19 +34,32 @@ logger.info("Database URL: %s", settings.database_url)
 
 app.include_router(api_router)
 
-origins = settings.cors_allow_origins
+# CORSMiddleware проверяет Origin через `in`: множество вместо списка
+origins = frozenset(settings.cors_allow_origins)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # Явные списки: preflight-ответ не зависит от заголовков запроса
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
 )
+# Списки товаров — большой и однообразный JSON, сжимается в разы
+app.add_middleware(GZipMiddleware, minimum_size=settings.gzip_minimum_size)
 
 
 @app.on_event("startup")
 def startup():
+    # Sync-эндпоинты выполняются в пуле потоков AnyIO (по умолчанию 40 потоков)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = (
+        settings.threadpool_size
+    )
+    logger.info("threadpool size: %s", settings.threadpool_size)
+    # Схема создаётся один раз при старте, а не при каждом импорте модуля;
+    # если таблицами управляют вручную — AUTO_CREATE_SCHEMA=false
+    if settings.auto_create_schema:
+        Base.metadata.create_all(bind=engine)
     scheduler_start()
     scheduler_rebuild_jobs_from_db()
 
@@ -51,3 +67,4 @@ def startup():
 @app.on_event("shutdown")
 def shutdown():
     scheduler_shutdown()
+    close_scales_pool()
@@ -1,5 +1,13 @@
 from ..db import Base
-from sqlalchemy import String, Integer, Boolean, ForeignKey, UniqueConstraint, Text
+from sqlalchemy import (
+    String,
+    Integer,
+    Boolean,
+    ForeignKey,
+    Index,
+    UniqueConstraint,
+    Text,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 
@@ -7,6 +15,8 @@ class Device(Base):
     __tablename__ = "devices"
     __table_args__ = (
         UniqueConstraint("owner_id", "name", name="uq_device_owner_name"),
+        # Список устройств владельца и проверка владельца — один проход по индексу
+        Index("ix_device_owner_id_id", "owner_id", "id"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
@@ -1,7 +1,9 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class AutoUpdateConfig(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     enabled: bool
     interval_minutes: int = Field(ge=1)
     last_run_utc: str | None = None
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class DeviceCreate(BaseModel):
@@ -20,6 +20,8 @@ class DeviceUpdate(BaseModel):
 
 
 class DeviceOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     name: str
     description: str
@@ -27,6 +29,3 @@ class DeviceOut(BaseModel):
     port: int
     protocol: str
     cached_dirty: bool
-
-    class Config:
-        from_attributes = True
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from cryptography.fernet import Fernet
 from ..config import settings
 
@@ -8,5 +10,8 @@ def encrypt_device_password(password: str) -> str:
     return _fernet.encrypt(password.encode("utf-8")).decode("utf-8")
 
 
+@lru_cache(maxsize=1024)
 def decrypt_device_password(password_encrypted: str) -> str:
+    # Шифротекст однозначно определяет пароль, поэтому результат можно кэшировать:
+    # смена пароля устройства даёт новый шифротекст и промах кэша.
     return _fernet.decrypt(password_encrypted.encode("utf-8")).decode("utf-8")
@@ -1,23 +1,43 @@
+import time
 from datetime import datetime, timedelta, timezone
-from jose import jwt, JWTError
+from functools import lru_cache
+
+import jwt
+from jwt import ExpiredSignatureError, InvalidTokenError
+
 from ..config import settings
 
+# Ключ и список алгоритмов собираются один раз, а не на каждый запрос
+_secret_key = settings.jwt_secret_key.encode("utf-8")
+_algorithms = [settings.jwt_algorithm]
+
 
 def create_access_token(subject: str) -> str:
     exp = datetime.now(timezone.utc) + timedelta(
         minutes=settings.jwt_access_token_minutes
     )
     payload = {"sub": subject, "exp": exp}
-    return jwt.encode(
-        payload, settings.jwt_secret_key, algorithm=settings.jwt_algorithm
-    )
+    return jwt.encode(payload, _secret_key, algorithm=settings.jwt_algorithm)
 
 
-def decode_access_token(token: str) -> str:
+@lru_cache(maxsize=settings.jwt_decode_cache_size)
+def _decode_verified(token: str) -> tuple[str, float]:
+    """
+    Проверка подписи и разбор токена. Кэшируются только валидные токены:
+    на ошибке lru_cache ничего не запоминает.
+    """
     payload = jwt.decode(
-        token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm]
+        token, _secret_key, algorithms=_algorithms, options={"require": ["exp"]}
     )
     sub = payload.get("sub")
     if not sub:
-        raise JWTError("Missing sub")
-    return str(sub)
+        raise InvalidTokenError("Missing sub")
+    return str(sub), float(payload["exp"])
+
+
+def decode_access_token(token: str) -> str:
+    sub, exp = _decode_verified(token)
+    # Срок действия проверяется на каждый запрос, даже при попадании в кэш
+    if exp <= time.time():
+        raise ExpiredSignatureError("Signature has expired")
+    return sub
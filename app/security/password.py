@@ -1,11 +1,78 @@
-from passlib.context import CryptContext
+import base64
+import hashlib
+import hmac
+import secrets
+import threading
+from collections import OrderedDict
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+from ..config import settings
+
+# Формат хэша совместим с passlib pbkdf2_sha256:
+# $pbkdf2-sha256$<rounds>$<salt ab64>$<checksum ab64>
+# Число итераций задаётся через .env (PASSWORD_HASH_ROUNDS): на слабом железе
+# его можно снизить. Уже сохранённые хэши проверяются со своим числом итераций.
+_SCHEME = "pbkdf2-sha256"
+_SALT_SIZE = 16
+
+
+def _ab64_encode(data: bytes) -> str:
+    # "adapted base64" passlib: '.' вместо '+', без '='
+    return base64.b64encode(data).decode("ascii").rstrip("=").replace("+", ".")
+
+
+def _ab64_decode(value: str) -> bytes:
+    value = value.replace(".", "+")
+    return base64.b64decode(value + "=" * (-len(value) % 4))
+
+
+def _pbkdf2(password: str, salt: bytes, rounds: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, rounds)
+
+
+# Кэш успешных проверок: HMAC(pepper, password) + hash -> OK.
+# Pepper генерируется на процесс, поэтому сам пароль в памяти не хранится,
+# а утечка кэша без pepper не даёт ничего для перебора.
+_verify_pepper = secrets.token_bytes(32)
+_verify_cache: "OrderedDict[tuple[bytes, str], None]" = OrderedDict()
+_verify_cache_lock = threading.Lock()
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    rounds = settings.password_hash_rounds
+    salt = secrets.token_bytes(_SALT_SIZE)
+    checksum = _pbkdf2(password, salt, rounds)
+    return f"${_SCHEME}${rounds}${_ab64_encode(salt)}${_ab64_encode(checksum)}"
+
+
+def _check_password(password: str, password_hash: str) -> bool:
+    try:
+        _, scheme, rounds, salt, checksum = password_hash.split("$")
+        if scheme != _SCHEME:
+            return False
+        expected = _ab64_decode(checksum)
+        actual = _pbkdf2(password, _ab64_decode(salt), int(rounds))
+    except ValueError:
+        # Повреждённый или чужой формат хэша — как неверный пароль
+        return False
+    return hmac.compare_digest(actual, expected)
 
 
 def verify_password(password: str, password_hash: str) -> bool:
-    return pwd_context.verify(password, password_hash)
+    key = (
+        hmac.new(_verify_pepper, password.encode("utf-8"), hashlib.sha256).digest(),
+        password_hash,
+    )
+    with _verify_cache_lock:
+        if key in _verify_cache:
+            _verify_cache.move_to_end(key)
+            return True
+
+    if not _check_password(password, password_hash):
+        return False
+
+    if settings.password_verify_cache_size > 0:
+        with _verify_cache_lock:
+            _verify_cache[key] = None
+            while len(_verify_cache) > settings.password_verify_cache_size:
+                _verify_cache.popitem(last=False)
+    return True
@@ -1,12 +1,27 @@
-from .products_cache_service import load_cached_products, save_cached_products
+from .products_cache_service import (
+    cached_products_response_body,
+    find_product_by_plu,
+    forget_cached_products,
+    forget_plu_index,
+    load_cached_products,
+    patch_cached_product,
+    save_cached_products,
+)
 from .scales_service import (
     fetch_products_and_cache,
+    fetch_products_only,
     push_cache_to_scales,
 )
 
 __all__ = [
+    "cached_products_response_body",
+    "find_product_by_plu",
+    "forget_cached_products",
+    "forget_plu_index",
     "load_cached_products",
+    "patch_cached_product",
     "save_cached_products",
     "fetch_products_and_cache",
+    "fetch_products_only",
     "push_cache_to_scales",
 ]
@@ -1,103 +1,204 @@
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
-from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, joinedload
 
 from scales.exceptions import DeviceError
 
 from ..db import SessionLocal
 from ..models import AutoUpdateSchedule, Device
-from . import fetch_products_and_cache, push_cache_to_scales, save_cached_products
+from . import fetch_products_only, push_cache_to_scales, save_cached_products
 
 logger = logging.getLogger("app.auto_update")
 
 
 def utc_now_str() -> str:
-    return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+    t = datetime.now(timezone.utc)
+    return (
+        f"{t.year:04d}-{t.month:02d}-{t.day:02d}"
+        f"T{t.hour:02d}:{t.minute:02d}:{t.second:02d}Z"
+    )
+
+
+def _dialect_insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    return {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(dialect)
+
+
+def get_or_create_auto_update_schedule(
+    db: Session, device_id: int, *, enabled: bool, interval_minutes: int
+) -> AutoUpdateSchedule:
+    """
+    Вернуть расписание устройства, создав его со значениями по умолчанию.
+    INSERT ... ON CONFLICT (device_id) DO NOTHING: параллельные запросы
+    не падают на уникальном ключе, а читают уже созданную строку.
+    """
+    insert = _dialect_insert(db)
+    sch = None
+    if insert is not None:
+        stmt = (
+            insert(AutoUpdateSchedule)
+            .values(
+                device_id=device_id,
+                enabled=enabled,
+                interval_minutes=interval_minutes,
+                last_run_utc=None,
+                last_status=None,
+                last_error=None,
+            )
+            .on_conflict_do_nothing(index_elements=[AutoUpdateSchedule.device_id])
+            .returning(AutoUpdateSchedule)
+        )
+        sch = db.scalars(stmt).one_or_none()
+        db.commit()
+    if sch is None:
+        sch = (
+            db.query(AutoUpdateSchedule)
+            .filter(AutoUpdateSchedule.device_id == device_id)
+            .one_or_none()
+        )
+    if sch is None:
+        sch = AutoUpdateSchedule(
+            device_id=device_id,
+            enabled=enabled,
+            interval_minutes=interval_minutes,
+        )
+        db.add(sch)
+        db.commit()
+    return sch
+
+
+def upsert_auto_update_schedule(
+    db: Session, device_id: int, *, enabled: bool, interval_minutes: int
+) -> AutoUpdateSchedule:
+    """
+    Создать или обновить расписание устройства одним запросом
+    INSERT ... ON CONFLICT (device_id) DO UPDATE ... RETURNING.
+    Для диалектов без upsert используется обычный SELECT + INSERT/UPDATE.
+    """
+    insert = _dialect_insert(db)
+    if insert is None:
+        sch = (
+            db.query(AutoUpdateSchedule)
+            .filter(AutoUpdateSchedule.device_id == device_id)
+            .one_or_none()
+        )
+        if not sch:
+            sch = AutoUpdateSchedule(device_id=device_id)
+        sch.enabled = enabled
+        sch.interval_minutes = interval_minutes
+        db.add(sch)
+        db.commit()
+        return sch
+
+    stmt = insert(AutoUpdateSchedule).values(
+        device_id=device_id,
+        enabled=enabled,
+        interval_minutes=interval_minutes,
+        last_run_utc=None,
+        last_status=None,
+        last_error=None,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AutoUpdateSchedule.device_id],
+        set_={
+            "enabled": stmt.excluded.enabled,
+            "interval_minutes": stmt.excluded.interval_minutes,
+        },
+    ).returning(AutoUpdateSchedule)
+    sch = db.scalars(stmt, execution_options={"populate_existing": True}).one()
+    db.commit()
+    return sch
+
+
+def _scales_date(d: datetime) -> str:
+    # Формат весов "%d-%m-%y" без strftime
+    return f"{d.day:02d}-{d.month:02d}-{d.year % 100:02d}"
 
 
 def update_dates_only(products: dict) -> dict:
     today = datetime.now()
-    fmt = "%d-%m-%y"
 
     items = products.get("products", [])
     if not isinstance(items, list):
         return products
 
+    # Дата изготовления одна на всех, дата реализации — одна на каждый срок годности
+    manufacture_date = _scales_date(today)
+    sell_by_dates: dict[int, str] = {}
+
     for p in items:
         if not isinstance(p, dict):
             continue
         shelf = int(p.get("shelfLifeInDays", 0) or 0)
-        p["manufactureDate"] = today.strftime(fmt)
-        p["sellByDate"] = (today + timedelta(days=shelf)).strftime(fmt)
+        sell_by = sell_by_dates.get(shelf)
+        if sell_by is None:
+            sell_by = _scales_date(today + timedelta(days=shelf))
+            sell_by_dates[shelf] = sell_by
+        p["manufactureDate"] = manufacture_date
+        p["sellByDate"] = sell_by
 
     return products
 
 
+def _save_run_status(
+    db: Session, device_id: int, status: str, error: str | None
+) -> None:
+    """
+    Результат прогона — один UPDATE трёх колонок, без загрузки строки.
+    """
+    db.rollback()  # сбросить незавершённую транзакцию после ошибки
+    db.execute(
+        update(AutoUpdateSchedule)
+        .where(AutoUpdateSchedule.device_id == device_id)
+        .values(last_run_utc=utc_now_str(), last_status=status, last_error=error)
+    )
+    db.commit()
+
+
 def auto_update_job(device_id: int) -> None:
     """
     Выполнение одного прогона автоматического обновления по device_id.
     """
     db: Session = SessionLocal()
+    status: str | None = None
+    error: str | None = None
     try:
-        device = db.get(Device, device_id)
+        device = db.get(Device, device_id, options=(joinedload(Device.schedule),))
         if not device:
             return
 
-        sch = (
-            db.query(AutoUpdateSchedule)
-            .filter(AutoUpdateSchedule.device_id == device_id)
-            .one_or_none()
-        )
+        sch = device.schedule
         if not sch or not sch.enabled:
             return
 
-        # Обновление кэша товаров
-        products = fetch_products_and_cache(db, device)
-
-        # обновление дат и сохранение обновленных данных в кэш
-        products = update_dates_only(products)
+        # Выгрузка товаров с весов, обновление дат и одна запись в кэш
+        products = update_dates_only(fetch_products_only(device))
         save_cached_products(db, device, products, dirty=False)
 
-        # Обновление товаров в устройстве
-        push_cache_to_scales(db, device)
-
-        # Фиксация результата операции
-        sch.last_run_utc = utc_now_str()
-        sch.last_status = "OK"
-        sch.last_error = None
-        db.add(sch)
-        db.commit()
+        # Обновление товаров в устройстве; pluNumber проверены при выгрузке,
+        # а update_dates_only их не меняет
+        push_cache_to_scales(db, device, products, plu_validated=True)
 
+        status = "OK"
         logger.info("Auto-update OK: device_id=%d name=%s", device_id, device.name)
 
     except DeviceError as e:
-        sch = (
-            db.query(AutoUpdateSchedule)
-            .filter(AutoUpdateSchedule.device_id == device_id)
-            .one_or_none()
-        )
-        if sch:
-            sch.last_run_utc = utc_now_str()
-            sch.last_status = "ERROR"
-            sch.last_error = str(e)
-            db.add(sch)
-            db.commit()
+        status, error = "ERROR", str(e)
         logger.error("Auto-update DeviceError device_id=%d: %s", device_id, e)
 
     except Exception as e:
-        sch = (
-            db.query(AutoUpdateSchedule)
-            .filter(AutoUpdateSchedule.device_id == device_id)
-            .one_or_none()
-        )
-        if sch:
-            sch.last_run_utc = utc_now_str()
-            sch.last_status = "ERROR"
-            sch.last_error = f"Unexpected: {e}"
-            db.add(sch)
-            db.commit()
+        status, error = "ERROR", f"Unexpected: {e}"
         logger.exception("Auto-update unexpected device_id=%d: %s", device_id, e)
 
     finally:
-        db.close()
+        try:
+            # Фиксация результата операции; без status прогон был пропущен
+            if status is not None:
+                _save_run_status(db, device_id, status, error)
+        except Exception:
+            logger.exception("Auto-update status save failed device_id=%d", device_id)
+        finally:
+            db.close()
@@ -1,50 +1,236 @@
-import logging
 import json
+import logging
+import re
+import threading
+
+import orjson
+from cachetools import LRUCache
+
+from ..config import settings
 from ..models import Device
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger("app.services.products_cache")
 
+# orjson работает только с целыми в пределах 64 бит: при записи выбрасывает
+# ошибку, а при чтении молча превращает большее число во float. Прошивка
+# весов может отдавать такие числа, и стандартный json их сохранял, поэтому
+# для них используется он. Любое целое вне [-2**63, 2**64) записывается
+# минимум 19 цифрами подряд (отрицательные от -2**63-1 — уже 19 цифр);
+# совпадение внутри строки или с 64-битным числом лишь выбирает медленный путь.
+_WIDE_INT_RE = re.compile(r"\d{19,}")
+
+
+def dumps_products(data) -> str:
+    """
+    JSON товаров: orjson, а для целых шире 64 бит — стандартный json.
+    """
+    try:
+        return orjson.dumps(data).decode("utf-8")
+    except orjson.JSONEncodeError:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads_products(raw: str):
+    """
+    Разбор JSON товаров без потери точности целых шире 64 бит.
+    """
+    if _WIDE_INT_RE.search(raw):
+        return json.loads(raw)
+    return orjson.loads(raw)
+
+
+# Индекс pluNumber -> позиция товара в списке, по device_id.
+# Индекс может устареть (кэш перезаписан), поэтому каждое попадание
+# сверяется с самим товаром, а при расхождении индекс перестраивается.
+_plu_index_cache: LRUCache = LRUCache(maxsize=256)
+_plu_index_lock = threading.Lock()
+
+# Разобранный кэш товаров по device_id вместе с JSON, из которого он получен.
+# Запись действительна, пока строка в БД совпадает с сохранённой: сравнение
+# строк дешевле повторного разбора. Возвращаемый dict общий для всех запросов
+# и потоков, поэтому только для чтения: изменения собираются в новом объекте
+# (см. patch_cached_product), который попадает сюда после commit.
+_parsed_cache: LRUCache = LRUCache(maxsize=settings.products_parsed_cache_size)
+_parsed_cache_lock = threading.Lock()
+
+
+def _parsed_cache_get(device: Device) -> dict | None:
+    if settings.products_parsed_cache_size <= 0:
+        return None
+    with _parsed_cache_lock:
+        entry = _parsed_cache.get(device.id)
+    if entry is not None and entry[0] == device.products_cache_json:
+        return entry[1]
+    return None
+
+
+def _parsed_cache_put(device: Device, raw: str, data: dict) -> None:
+    if settings.products_parsed_cache_size <= 0:
+        return
+    with _parsed_cache_lock:
+        _parsed_cache[device.id] = (raw, data)
+
+
+def _parsed_cache_invalidate(device: Device) -> None:
+    with _parsed_cache_lock:
+        _parsed_cache.pop(device.id, None)
+
+
+def forget_cached_products(device_id: int) -> None:
+    """
+    Убрать из памяти разобранный кэш и PLU-индекс устройства
+    (например, после удаления устройства).
+    """
+    with _parsed_cache_lock:
+        _parsed_cache.pop(device_id, None)
+    forget_plu_index(device_id)
+
+
+def forget_plu_index(device_id: int) -> None:
+    """
+    Сбросить PLU-индекс устройства. Нужно, когда меняется сам pluNumber:
+    индекс, указывающий на другой товар с тем же pluNumber, проверку
+    _plu_matches проходит, хотя первым совпадением в списке уже не является.
+    """
+    with _plu_index_lock:
+        _plu_index_cache.pop(device_id, None)
+
+
+def _build_plu_index(items: list) -> dict[str, int]:
+    index: dict[str, int] = {}
+    for i, p in enumerate(items):
+        if isinstance(p, dict) and "pluNumber" in p:
+            index.setdefault(str(p["pluNumber"]), i)
+    return index
+
+
+def _plu_matches(items: list, idx: int | None, plu: str) -> bool:
+    if idx is None or idx >= len(items):
+        return False
+    p = items[idx]
+    return isinstance(p, dict) and "pluNumber" in p and str(p["pluNumber"]) == plu
+
+
+def _find_product_index(device: Device, items: list, plu: str) -> int | None:
+    plu = str(plu)
+    with _plu_index_lock:
+        index = _plu_index_cache.get(device.id)
+    if index is not None:
+        idx = index.get(plu)
+        if _plu_matches(items, idx, plu):
+            return idx
+
+    index = _build_plu_index(items)
+    with _plu_index_lock:
+        _plu_index_cache[device.id] = index
+    return index.get(plu)
+
+
+def find_product_by_plu(device: Device, items: list, plu: str) -> dict | None:
+    """
+    Поиск товара по pluNumber в списке товаров кэша устройства за O(1).
+    """
+    idx = _find_product_index(device, items, plu)
+    return items[idx] if idx is not None else None
+
+
+def patch_cached_product(
+    device: Device, products: dict, plu: str, fields: dict
+) -> dict | None:
+    """
+    Копия products с изменёнными полями товара pluNumber=plu; None, если
+    товара нет. Копируются только корневой dict, список и сам товар:
+    остальные товары общие с исходным объектом, который не меняется, —
+    параллельные запросы продолжают видеть сохранённое состояние.
+    """
+    items = products["products"]
+    idx = _find_product_index(device, items, plu)
+    if idx is None:
+        return None
+    patched_items = list(items)
+    patched_items[idx] = {**items[idx], **fields}
+    return {**products, "products": patched_items}
+
 
 def load_cached_products(device: Device) -> dict:
-    device_id = getattr(device, "id", None)
+    """
+    Товары из кэша устройства. Результат может быть общим с другими
+    запросами, поэтому менять его на месте нельзя.
+    """
+    device_id = device.id
     if not device.products_cache_json:
         logger.info("products_cache miss | device_id=%s", device_id)
         return {"products": []}
 
     try:
-        data = json.loads(device.products_cache_json)
-        products_count = (
-            len(data.get("products", [])) if isinstance(data, dict) else "n/a"
-        )
-        logger.info(
-            "products_cache hit | device_id=%s | cached_dirty=%s | count=%s",
-            device_id,
-            getattr(device, "cached_dirty", None),
-            products_count,
-        )
+        data = _parsed_cache_get(device)
+        if data is None:
+            data = loads_products(device.products_cache_json)
+            if isinstance(data, dict):
+                _parsed_cache_put(device, device.products_cache_json, data)
+        if logger.isEnabledFor(logging.INFO):
+            products_count = (
+                len(data.get("products", [])) if isinstance(data, dict) else "n/a"
+            )
+            logger.info(
+                "products_cache hit | device_id=%s | cached_dirty=%s | count=%s",
+                device_id,
+                device.cached_dirty,
+                products_count,
+            )
         return data
     except Exception:
         logger.exception("products_cache parse failed | device_id=%s", device_id)
         raise
 
 
+def cached_products_response_body(device: Device) -> bytes:
+    """
+    Тело ответа ProductsResponse прямо из сохранённого JSON кэша:
+    без разбора и повторной сериализации. Кэш пишется только через
+    save_cached_products, поэтому в колонке всегда валидный JSON.
+    """
+    device_id = device.id
+    if not device.products_cache_json:
+        logger.info("products_cache miss | device_id=%s", device_id)
+        return b'{"products":{"products":[]}}'
+
+    logger.info(
+        "products_cache raw hit | device_id=%s | cached_dirty=%s | size=%s",
+        device_id,
+        device.cached_dirty,
+        len(device.products_cache_json),
+    )
+    return b'{"products":' + device.products_cache_json.encode("utf-8") + b"}"
+
+
 def save_cached_products(
     db: Session, device: Device, products: dict, *, dirty: bool
 ) -> None:
-    device_id = getattr(device, "id", None)
+    device_id = device.id
     try:
-        device.products_cache_json = json.dumps(products, ensure_ascii=False)
+        raw = dumps_products(products)
     except Exception:
         logger.exception(
             "products_cache serialize failed | device_id=%s",
             device_id,
         )
         raise
+    if raw == device.products_cache_json and device.cached_dirty == dirty:
+        # Весы вернули то же, что уже лежит в кэше: транзакция не нужна
+        _parsed_cache_put(device, raw, products)
+        logger.info("products_cache unchanged | device_id=%s", device_id)
+        return
+    device.products_cache_json = raw
     device.cached_dirty = dirty
     db.add(device)
-    db.commit()
-    db.refresh(device)
+    try:
+        db.commit()
+    except Exception:
+        _parsed_cache_invalidate(device)
+        raise
+    _parsed_cache_put(device, raw, products)
     logger.info(
         "products_cache saved | device_id=%s | dirty=%s",
         device_id,
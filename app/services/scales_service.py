@@ -1,41 +1,60 @@
 from __future__ import annotations
 
-import copy
-import json
 import logging
 import time
 from contextlib import contextmanager
 from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
 from typing import Any, Callable, Iterable, List, Dict, Tuple, Optional
 from typing import Iterator
 
-
 from scales.exceptions import DeviceError
-from ..integrations.mertech import get_scales
+from ..integrations.mertech import call_scales, close_scales_client, get_scales
 from sqlalchemy.orm import Session
 
-from .products_cache_service import load_cached_products, save_cached_products
+from .products_cache_service import (
+    dumps_products,
+    load_cached_products,
+    loads_products,
+    save_cached_products,
+)
 from ..config import settings
 from ..models import Device
 
 logger = logging.getLogger("app.scales_client")
 
 
+class _LogFields:
+    """
+    Поля операции в виде "k=v | k=v"; строка собирается только если
+    запись лога действительно выводится.
+    """
+
+    __slots__ = ("fields",)
+
+    def __init__(self, fields: Dict[str, Any]) -> None:
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return " | ".join(f"{k}={v}" for k, v in self.fields.items())
+
+
 @contextmanager
 def _timed(op: str, **fields: Any) -> Iterator[None]:
     """
     Контекстный менеджер для логирования операции с измерением длительности.
     """
+    log_fields = _LogFields(fields)
     start = time.perf_counter()
-    logger.info("start %s | %s", op, fields)
+    logger.info("start %s | %s", op, log_fields)
     try:
         yield
         dur_ms = int((time.perf_counter() - start) * 1000)
-        logger.info("success %s | duration_ms=%s | %s", op, dur_ms, fields)
+        logger.info("success %s | duration_ms=%s | %s", op, dur_ms, log_fields)
     except Exception:
         dur_ms = int((time.perf_counter() - start) * 1000)
-        logger.exception("fail %s | duration_ms=%s | %s", op, dur_ms, fields)
+        logger.exception("fail %s | duration_ms=%s | %s", op, dur_ms, log_fields)
         raise
 
 
@@ -44,13 +63,15 @@ def validate_plu_uniqueness(products: dict) -> None:
     if not isinstance(items, list):
         raise DeviceError("Некорректный формат: поле products должно быть массивом.")
 
+    keys = [
+        str(p["pluNumber"]) for p in items if isinstance(p, dict) and "pluNumber" in p
+    ]
+    if len(set(keys)) == len(keys):
+        return
+
+    # Медленный путь только при ошибке: первый повтор в порядке списка
     seen = set()
-    for p in items:
-        if not isinstance(p, dict):
-            continue
-        if "pluNumber" not in p:
-            continue
-        key = str(p["pluNumber"])
+    for key in keys:
         if key in seen:
             raise DeviceError(
                 f"Нарушение уникальности pluNumber в рамках устройства: pluNumber={key}"
@@ -58,28 +79,19 @@ def validate_plu_uniqueness(products: dict) -> None:
         seen.add(key)
 
 
-def fetch_products_and_cache(db: Session, device: Device) -> dict:
-    device_id = getattr(device, "id", None)
-    fields = {
-        "device_id": device_id,
-        "ip": device.ip,
-        "port": device.port,
-        "protocol": device.protocol,
-    }
-
-    with _timed("scales.fetch_products_and_cache", **fields):
-        scales = get_scales(device)
-
-        logger.info(
-            "fetch products from scales | device_id=%s | ip=%s | port=%s | protocol=%s",
-            device_id,
-            device.ip,
-            device.port,
-            device.protocol,
-        )
+def _fetch_products(device: Device) -> dict:
+    device_id = device.id
+    logger.info(
+        "fetch products from scales | device_id=%s | ip=%s | port=%s | protocol=%s",
+        device_id,
+        device.ip,
+        device.port,
+        device.protocol,
+    )
 
-        products = scales.get_products_json()
+    products = call_scales(device, lambda scales: scales.get_products_json())
 
+    if logger.isEnabledFor(logging.INFO):
         products_count = (
             len(products.get("products", [])) if isinstance(products, dict) else "n/a"
         )
@@ -89,47 +101,83 @@ def fetch_products_and_cache(db: Session, device: Device) -> dict:
             products_count,
         )
 
-        validate_plu_uniqueness(products)
-        save_cached_products(db, device, products, dirty=False)
-        return products
+    validate_plu_uniqueness(products)
+    return products
 
 
-def push_cache_to_scales(db: Session, device: Device) -> None:
-    device_id = getattr(device, "id", None)
-    fields = {
-        "device_id": device_id,
+def _device_fields(device: Device) -> dict:
+    return {
+        "device_id": device.id,
         "ip": device.ip,
         "port": device.port,
         "protocol": device.protocol,
     }
 
-    with _timed("scales.push_cache_to_scales", **fields):
-        if not device.products_cache_json:
-            logger.warning(
-                "push cache skipped | device_id=%s | reason=no_cache", device_id
-            )
-            raise DeviceError(
-                "Нет кэша товаров для загрузки. Сначала выполните выгрузку товаров с весов."
-            )
 
-        scales = get_scales(device)
-        products = load_cached_products(device)
+def fetch_products_only(device: Device) -> dict:
+    """
+    Выгрузить товары с весов без записи в кэш: для сценариев, которые
+    сначала меняют товары, а потом сохраняют их один раз.
+    """
+    with _timed("scales.fetch_products_only", **_device_fields(device)):
+        return _fetch_products(device)
 
-        products_count = (
-            len(products.get("products", [])) if isinstance(products, dict) else "n/a"
-        )
-        logger.info(
-            "push cache to scales | device_id=%s | count=%s | cached_dirty=%s",
-            device_id,
-            products_count,
-            getattr(device, "cached_dirty", None),
-        )
 
-        validate_plu_uniqueness(products)
+def fetch_products_and_cache(db: Session, device: Device) -> dict:
+    with _timed("scales.fetch_products_and_cache", **_device_fields(device)):
+        products = _fetch_products(device)
+        save_cached_products(db, device, products, dirty=False)
+        return products
+
+
+def push_cache_to_scales(
+    db: Session,
+    device: Device,
+    products: dict | None = None,
+    *,
+    plu_validated: bool = False,
+) -> None:
+    """
+    Загрузить товары на весы. products передаётся, если вызывающий код только
+    что сохранил их в кэш: тогда кэш повторно не читается.
+    plu_validated=True — уникальность pluNumber уже проверена для этих products.
+    """
+    device_id = device.id
+
+    with _timed("scales.push_cache_to_scales", **_device_fields(device)):
+        if products is None:
+            if not device.products_cache_json:
+                logger.warning(
+                    "push cache skipped | device_id=%s | reason=no_cache", device_id
+                )
+                raise DeviceError(
+                    "Нет кэша товаров для загрузки. Сначала выполните выгрузку товаров с весов."
+                )
+            products = load_cached_products(device)
+
+        if logger.isEnabledFor(logging.INFO):
+            products_count = (
+                len(products.get("products", []))
+                if isinstance(products, dict)
+                else "n/a"
+            )
+            logger.info(
+                "push cache to scales | device_id=%s | count=%s | cached_dirty=%s",
+                device_id,
+                products_count,
+                device.cached_dirty,
+            )
+
+        if not plu_validated:
+            validate_plu_uniqueness(products)
 
         try:
-            scales.send_json_products(
-                products, clear_database=settings.clear_database_while_updating_products
+            call_scales(
+                device,
+                lambda scales: scales.send_json_products(
+                    products,
+                    clear_database=settings.clear_database_while_updating_products,
+                ),
             )
         except DeviceError as e:
             if settings.products_fix_mode:
@@ -148,10 +196,12 @@ def push_cache_to_scales(db: Session, device: Device) -> None:
                 )
                 raise
 
-        device.cached_dirty = False
-        db.add(device)
-        db.commit()
-        db.refresh(device)
+        # После save_cached_products(dirty=False) флаг уже сброшен и зафиксирован:
+        # лишняя транзакция без изменений не нужна
+        if device.cached_dirty:
+            device.cached_dirty = False
+            db.add(device)
+            db.commit()
 
         logger.info(
             "push cache completed | device_id=%s | cached_dirty=%s",
@@ -165,7 +215,9 @@ def diagnose_broken_product(device: Device, products_payload: dict) -> None:
     Диагностический режим загрузки товаров:
     сохраняет структуру payload, меняется только список products.
     Для каждого теста создаёт новый Scales-клиент, чтобы не тащить состояние сокета
-    после предыдущей ошибки/порции.
+    после предыдущей ошибки/порции. При PRODUCTS_DIAG_REUSE_CLIENT=true клиент
+    берётся из пула call_scales: после успешной попытки соединение
+    переиспользуется, после ошибки клиент закрывается.
     """
     items = products_payload.get("products", [])
     if not isinstance(items, list):
@@ -173,21 +225,20 @@ def diagnose_broken_product(device: Device, products_payload: dict) -> None:
 
     logger.warning(
         "diagnostic mode started | device_id=%s | total_products=%s",
-        getattr(device, "id", None),
+        device.id,
         len(items),
     )
 
-    # Шаблон: весь payload как есть без товаров
-    template = copy.deepcopy(products_payload)
-    template["products"] = []
+    # Шаблон: весь payload как есть без товаров. Поверхностной копии достаточно:
+    # остальные ключи payload не изменяются, а отправка их только сериализует
+    template = {k: v for k, v in products_payload.items() if k != "products"}
 
     for idx, item in enumerate(items, start=1):
         plu = item.get("pluNumber")
         name = item.get("name")
 
         # Собираем payload той же структуры, что и основной, но с 1 товаром
-        single_payload = copy.deepcopy(template)
-        single_payload["products"] = [item]
+        single_payload = {**template, "products": [item]}
 
         try:
             logger.info(
@@ -197,13 +248,24 @@ def diagnose_broken_product(device: Device, products_payload: dict) -> None:
                 name,
             )
 
-            # Новый клиент на каждую попытку (важно!)
-            scales = get_scales(device)
-
-            scales.send_json_products(
-                single_payload,
-                clear_database=settings.clear_database_while_updating_products_fix_mode,
-            )
+            if settings.products_diag_reuse_client:
+                call_scales(
+                    device,
+                    lambda scales: scales.send_json_products(
+                        single_payload,
+                        clear_database=settings.clear_database_while_updating_products_fix_mode,
+                    ),
+                )
+            else:
+                # Новый клиент на каждую попытку (важно!)
+                scales = get_scales(device)
+                try:
+                    scales.send_json_products(
+                        single_payload,
+                        clear_database=settings.clear_database_while_updating_products_fix_mode,
+                    )
+                finally:
+                    close_scales_client(scales)
 
             logger.info("diagnostic upload OK | index=%s | pluNumber=%s", idx, plu)
 
@@ -215,16 +277,14 @@ def diagnose_broken_product(device: Device, products_payload: dict) -> None:
                 name,
                 str(e),
             )
-            logger.error(
-                "BROKEN PRODUCT FULL DATA | %s", json.dumps(item, ensure_ascii=False)
-            )
+            logger.error("BROKEN PRODUCT FULL DATA | %s", dumps_products(item))
             raise DeviceError(
                 f"Найден проблемный товар: index={idx}, pluNumber={plu}, name={name}"
             ) from e
 
     logger.warning(
         "diagnostic mode finished | device_id=%s | no broken products found",
-        getattr(device, "id", None),
+        device.id,
     )
 
 
@@ -251,17 +311,48 @@ class FindBadProductsResult:
     minimal_failing_groups: List[List[Dict[str, Any]]]
 
 
-def _chunks(items: List[Dict[str, Any]], size: int) -> Iterable[List[Dict[str, Any]]]:
-    for i in range(0, len(items), size):
-        yield items[i : i + size]
+def _chunks(
+    items: Iterable[Dict[str, Any]], size: int
+) -> Iterable[List[Dict[str, Any]]]:
+    # Подходит и для ленивых источников: в памяти одновременно только одна пачка
+    it = iter(items)
+    while chunk := list(islice(it, size)):
+        yield chunk
 
 
 def _build_payload_with_products(
     template_payload: Dict[str, Any], products_subset: List[Dict[str, Any]]
 ) -> Dict[str, Any]:
-    payload = copy.deepcopy(template_payload)
-    payload["products"] = products_subset
-    return payload
+    return {**template_payload, "products": products_subset}
+
+
+def _memoized_upload(
+    upload_fn: Callable[[Dict[str, Any]], None],
+) -> Callable[[Dict[str, Any]], None]:
+    """
+    Запоминает исход загрузки по набору товаров (id объектов в рамках одного
+    поиска): сужение и проверка по одному не отправляют на весы тот же набор
+    повторно. Упавший набор повторно выбрасывает сохранённое исключение.
+    """
+    passed: set[frozenset[int]] = set()
+    failed: Dict[frozenset[int], Exception] = {}
+
+    def upload(payload: Dict[str, Any]) -> None:
+        key = frozenset(map(id, payload.get("products", [])))
+        if key in passed:
+            logger.debug("upload skipped | known OK | count=%s", len(key))
+            return
+        if key in failed:
+            logger.debug("upload skipped | known FAIL | count=%s", len(key))
+            raise failed[key].with_traceback(None)
+        try:
+            upload_fn(payload)
+        except Exception as e:
+            failed[key] = e
+            raise
+        passed.add(key)
+
+    return upload
 
 
 def _try_upload_payload(
@@ -310,61 +401,96 @@ def _bisect_find_minimal_failing_group(
     """
     Возвращает минимальную подгруппу товаров, которая все еще падает при загрузке.
     Если по одному товару не падает, но в комбинации падает — вернет минимальную "комбинацию".
+    Сужение идёт циклом: каждый шаг заменяет group падающей подгруппой.
     """
-    # Базовый случай
-    if len(group) <= 1:
-        return group
-
-    mid = len(group) // 2
-    left = group[:mid]
-    right = group[mid:]
-
-    left_payload = _build_payload_with_products(template_payload, left)
-    ok_left, _ = _try_upload_payload(
-        upload_fn, left_payload, label=f"{label_prefix}/L({len(left)})"
-    )
-
-    if not ok_left:
-        return _bisect_find_minimal_failing_group(
-            upload_fn, template_payload, left, label_prefix=label_prefix + "/L"
+    while len(group) > 1:
+        mid = len(group) // 2
+        left = group[:mid]
+        right = group[mid:]
+
+        left_payload = _build_payload_with_products(template_payload, left)
+        ok_left, _ = _try_upload_payload(
+            upload_fn, left_payload, label=f"{label_prefix}/L({len(left)})"
         )
+        if not ok_left:
+            group, label_prefix = left, label_prefix + "/L"
+            continue
 
-    right_payload = _build_payload_with_products(template_payload, right)
-    ok_right, _ = _try_upload_payload(
-        upload_fn, right_payload, label=f"{label_prefix}/R({len(right)})"
-    )
-
-    if not ok_right:
-        return _bisect_find_minimal_failing_group(
-            upload_fn, template_payload, right, label_prefix=label_prefix + "/R"
+        right_payload = _build_payload_with_products(template_payload, right)
+        ok_right, _ = _try_upload_payload(
+            upload_fn, right_payload, label=f"{label_prefix}/R({len(right)})"
         )
+        if not ok_right:
+            group, label_prefix = right, label_prefix + "/R"
+            continue
 
-    # Если обе половины по отдельности проходят, но исходная группа падала — значит проблема комбинационная.
-    failing_combo: List[Dict[str, Any]] = []
-    base: List[Dict[str, Any]] = []
-
-    # Начнем с одного элемента слева и будем добавлять элементы справа, пока не упадет.
-    base = [left[0]]
-    for item in right:
-        candidate = base + [item]
-        cand_payload = _build_payload_with_products(template_payload, candidate)
-        ok, _ = _try_upload_payload(
-            upload_fn, cand_payload, label=f"{label_prefix}/COMBO({len(candidate)})"
-        )
-        if not ok:
-            failing_combo = candidate
-            break
+        # Если обе половины по отдельности проходят, но исходная группа падала — значит проблема комбинационная.
+        # Начнем с одного элемента слева и будем добавлять элементы справа, пока не упадет.
+        failing_combo: List[Dict[str, Any]] = []
+        base = [left[0]]
+        for item in right:
+            candidate = base + [item]
+            cand_payload = _build_payload_with_products(template_payload, candidate)
+            ok, _ = _try_upload_payload(
+                upload_fn,
+                cand_payload,
+                label=f"{label_prefix}/COMBO({len(candidate)})",
+            )
+            if not ok:
+                failing_combo = candidate
+                break
+
+        if not failing_combo:
+            # Если не нашли — возвращаем исходную группу
+            return group
+        if len(failing_combo) >= len(group):
+            # Пара, падающая только вместе, — дальше не сузить
+            return failing_combo
 
-    if failing_combo:
         # Уточняем минимальность уже для комбинации
-        return _bisect_find_minimal_failing_group(
-            upload_fn, template_payload, failing_combo, label_prefix=label_prefix + "/C"
-        )
+        group, label_prefix = failing_combo, label_prefix + "/C"
 
-    # Если не нашли — возвращаем исходную группу
     return group
 
 
+def _bisect_to_singles(
+    upload_fn: Callable[[Dict[str, Any]], None],
+    template_payload: Dict[str, Any],
+    group: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Возвращает товары группы, которые падают при загрузке по одному.
+    group уже падала целиком: проверяем половины пачками и спускаемся только
+    в упавшие, до одиночных товаров. Прошедшая половина целиком считается
+    исправной, поэтому вместо len(group) одиночных загрузок при единичных
+    проблемных товарах выходит порядка log2(len(group)).
+    """
+    bad: List[Dict[str, Any]] = []
+    pending = [group]
+    while pending:
+        current = pending.pop()
+        if len(current) == 1:
+            bad.append(current[0])
+            continue
+
+        mid = len(current) // 2
+        # Правую половину кладём первой, чтобы сохранить порядок товаров в bad
+        for half in (current[mid:], current[:mid]):
+            if len(half) == 1:
+                ref = ProductRef.from_item(half[0])
+                label = f"single plu={ref.plu} code={ref.code} name={ref.name[:40]}"
+            else:
+                label = f"singles/{len(half)}"
+            ok, _ = _try_upload_payload(
+                upload_fn,
+                _build_payload_with_products(template_payload, half),
+                label=label,
+            )
+            if not ok:
+                pending.append(half)
+    return bad
+
+
 def find_products_breaking_upload(
     upload_fn: Callable[[Dict[str, Any]], None],
     full_payload: Dict[str, Any],
@@ -383,7 +509,7 @@ def find_products_breaking_upload(
     Алгоритм:
       1) Идём пачками, чтобы быстро локализовать проблемный сегмент.
       2) Для каждой упавшей пачки — бинарно сужаем до минимальной падающей группы.
-      3) Проверяем элементы по одному, чтобы выделить проблемные товары.
+      3) Половинами сужаем минимальную группу до одиночных проблемных товаров.
     """
     if "products" not in full_payload or not isinstance(full_payload["products"], list):
         if raise_on_empty_products:
@@ -392,8 +518,8 @@ def find_products_breaking_upload(
             ok_count=0, total_count=0, bad_items=[], minimal_failing_groups=[]
         )
 
-    template_payload = copy.deepcopy(full_payload)
-    template_payload["products"] = []
+    template_payload = {k: v for k, v in full_payload.items() if k != "products"}
+    upload_fn = _memoized_upload(upload_fn)
 
     items: List[Dict[str, Any]] = full_payload["products"]
     total = len(items)
@@ -409,7 +535,7 @@ def find_products_breaking_upload(
 
     idx = 0
     while idx < total:
-        current_chunk = items[idx : min(total, idx + chunk_size)]
+        current_chunk = items[idx : idx + chunk_size]
         payload = _build_payload_with_products(template_payload, current_chunk)
 
         label = f"chunk idx={idx} size={len(current_chunk)}"
@@ -434,17 +560,10 @@ def find_products_breaking_upload(
             )
             minimal_failing_groups.append(failing_group)
 
-            # теперь проверим каждый элемент failing_group по одному
-            for it in failing_group:
-                single_payload = _build_payload_with_products(template_payload, [it])
-                ref = ProductRef.from_item(it)
-                ok_single, _ = _try_upload_payload(
-                    upload_fn,
-                    single_payload,
-                    label=f"single plu={ref.plu} code={ref.code} name={ref.name[:40]}",
-                )
-                if not ok_single:
-                    bad_items.append(it)
+            # теперь выделим из failing_group товары, падающие по одному
+            bad_items.extend(
+                _bisect_to_singles(upload_fn, template_payload, failing_group)
+            )
 
             # чтобы не зациклиться — сдвигаемся вперед на размер failing_group,
             # а chunk_size сбрасываем на поменьше.
@@ -466,7 +585,7 @@ def find_products_breaking_upload(
 
 def load_payload_from_file(path: str | Path) -> Dict[str, Any]:
     path = Path(path)
-    return json.loads(path.read_text(encoding="utf-8"))
+    return loads_products(path.read_text(encoding="utf-8"))
 
 
 def print_bad_products_report(res: FindBadProductsResult) -> None:
@@ -1,5 +1,8 @@
 import logging
+from datetime import timedelta
 
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy.orm import Session
 
@@ -11,7 +14,16 @@ from .auto_update_service import auto_update_job
 logger = logging.getLogger("app.scheduler")
 
 
-scheduler = BackgroundScheduler(timezone=settings.scheduler_timezone)
+# Jobs устройств ждут сокет весов, а не CPU: пул потоков позволяет
+# обслуживать несколько весов одновременно (max_instances=1 на устройство)
+scheduler = BackgroundScheduler(
+    timezone=settings.scheduler_timezone,
+    executors={
+        "default": ThreadPoolExecutor(max_workers=settings.scheduler_max_workers)
+    },
+)
+
+_JOB_PREFIX = "auto_update:"
 
 
 def scheduler_start() -> None:
@@ -32,7 +44,8 @@ def scheduler_shutdown() -> None:
 
 def scheduler_rebuild_jobs_from_db() -> None:
     """
-    Пересоздать jobs из таблицы расписаний.
+    Привести jobs к таблице расписаний: читаются только включённые расписания,
+    лишние jobs удаляются, а неизменённые (тот же интервал) не пересоздаются.
     """
     if not settings.scheduler_enabled:
         logger.info("scheduler disabled | skip rebuild_jobs_from_db")
@@ -40,25 +53,95 @@ def scheduler_rebuild_jobs_from_db() -> None:
 
     db: Session = SessionLocal()
     try:
-        schedules = db.query(AutoUpdateSchedule).all()
-        for sch in schedules:
-            job_id = f"auto_update:{sch.device_id}"
-
-            if scheduler.get_job(job_id):
-                scheduler.remove_job(job_id)
-
-            if sch.enabled:
-                scheduler.add_job(
-                    auto_update_job,
-                    "interval",
-                    minutes=sch.interval_minutes,
-                    args=[sch.device_id],
-                    id=job_id,
-                    replace_existing=True,
-                    max_instances=1,
-                    coalesce=True,
-                )
-
-        logger.info("scheduler jobs rebuilt | count=%d", len(schedules))
+        schedules = (
+            db.query(AutoUpdateSchedule.device_id, AutoUpdateSchedule.interval_minutes)
+            .filter(AutoUpdateSchedule.enabled.is_(True))
+            .all()
+        )
     finally:
         db.close()
+
+    wanted = {
+        _job_id(device_id): (device_id, interval_minutes)
+        for device_id, interval_minutes in schedules
+    }
+    existing = {
+        job.id: job for job in scheduler.get_jobs() if job.id.startswith(_JOB_PREFIX)
+    }
+
+    stale = existing.keys() - wanted.keys()
+    for job_id in stale:
+        scheduler.remove_job(job_id)
+
+    added = rescheduled = 0
+    for job_id, (device_id, interval_minutes) in wanted.items():
+        job = existing.get(job_id)
+        if job is None:
+            _add_device_job(device_id, interval_minutes)
+            added += 1
+        elif getattr(job.trigger, "interval", None) != timedelta(
+            minutes=interval_minutes
+        ):
+            # Меняется только триггер: job и его параметры остаются прежними
+            scheduler.reschedule_job(
+                job_id, trigger="interval", minutes=interval_minutes
+            )
+            rescheduled += 1
+
+    logger.info(
+        "scheduler jobs rebuilt | count=%d | added=%d | rescheduled=%d | removed=%d",
+        len(wanted),
+        added,
+        rescheduled,
+        len(stale),
+    )
+
+
+def _job_id(device_id: int) -> str:
+    return f"{_JOB_PREFIX}{device_id}"
+
+
+def _add_device_job(device_id: int, interval_minutes: int) -> None:
+    scheduler.add_job(
+        auto_update_job,
+        "interval",
+        minutes=interval_minutes,
+        args=[device_id],
+        id=_job_id(device_id),
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+
+def scheduler_upsert_job(
+    device_id: int, *, enabled: bool, interval_minutes: int
+) -> None:
+    """
+    Обновить job одного устройства без пересборки всей таблицы расписаний.
+    """
+    if not settings.scheduler_enabled:
+        logger.info("scheduler disabled | skip upsert_job | device_id=%s", device_id)
+        return
+    if not enabled:
+        scheduler_remove_job(device_id)
+        return
+
+    _add_device_job(device_id, interval_minutes)
+    logger.info(
+        "scheduler job upserted | device_id=%s | interval_minutes=%s",
+        device_id,
+        interval_minutes,
+    )
+
+
+def scheduler_remove_job(device_id: int) -> None:
+    if not settings.scheduler_enabled:
+        logger.info("scheduler disabled | skip remove_job | device_id=%s", device_id)
+        return
+
+    try:
+        scheduler.remove_job(_job_id(device_id))
+    except JobLookupError:
+        return
+    logger.info("scheduler job removed | device_id=%s", device_id)
@@ -0,0 +1,36 @@
+import os
+import unittest
+
+from cryptography.fernet import Fernet
+
+for key, value in {
+    "DATABASE_URL": "sqlite://",
+    "JWT_SECRET_KEY": "test-secret",
+    "JWT_ALGORITHM": "HS256",
+    "JWT_ACCESS_TOKEN_MINUTES": "60",
+    "FERNET_KEY": Fernet.generate_key().decode(),
+    "SCHEDULER_TIMEZONE": "UTC",
+}.items():
+    os.environ.setdefault(key, value)
+
+from app.services.products_cache_service import dumps_products, loads_products
+
+
+class ProductsJsonRoundTripTest(unittest.TestCase):
+    def test_wide_integers_round_trip(self):
+        for value in (-(2**63) - 1, 2**64, -(2**64)):
+            with self.subTest(value=value):
+                data = {"products": [{"pluNumber": 1, "code": value}]}
+                restored = loads_products(dumps_products(data))
+                self.assertEqual(restored, data)
+                self.assertIsInstance(restored["products"][0]["code"], int)
+
+    def test_64_bit_bounds_round_trip(self):
+        for value in (-(2**63), 2**63 - 1, 2**64 - 1):
+            with self.subTest(value=value):
+                data = {"products": [{"code": value, "name": "Молоко"}]}
+                self.assertEqual(loads_products(dumps_products(data)), data)
+
+
+if __name__ == "__main__":
+    unittest.main()